@@ -11,16 +11,33 @@
 
 import logging
 
-_BUSY_STATUSES = ("changing", "initializing")
+_BUSY_STATUSES = frozenset({"changing", "initializing"})
+
+# Shared-timer state machine
+_IDLE = 0
+_COMPUTE_PENDING = 1
+_TC_DEFERRED = 2
 
 
 class PinWatch:
+    __slots__ = (
+        "printer", "reactor", "name", "gcode", "buttons",
+        "toolchanger_name", "sync_toolchanger", "verbose", "assign_delay",
+        "debounce_delay", "pin_by_label", "t_indices", "current_tool",
+        "_run_script", "_label_kind", "_N", "_occ", "_full", "_e",
+        "_skip_noop",
+        "_timer", "_state", "_deadline", "_pending_reason",
+        "_pending_tc_ct", "_tc_backoff", "_tc_obj", "_ps_obj",
+        "_last_sync_ct", "_log_buf", "_status",
+    )
+
     def __init__(self, config):
         self.printer = config.get_printer()
         self.reactor = self.printer.get_reactor()
         self.name = config.get_name().split(" ", 1)[-1]
 
         self.gcode = self.printer.lookup_object("gcode")
+        self._run_script = self.gcode.run_script_from_command
         self.buttons = self.printer.load_object(config, "buttons")
 
         self.toolchanger_name = config.get("toolchanger", "toolchanger")
@@ -31,39 +48,96 @@ class PinWatch:
         # Use 0.0 for immediate.
         self.assign_delay = float(config.get("assign_delay", 0.0))
 
+        # Contact settle window (the per-pin debounce of the old
+        # register_debounce_button path): compute waits this long past the
+        # last edge, so bouncing contacts settle before state is read
+        self.debounce_delay = config.getfloat("debounce_delay", 0., minval=0.)
+
         # Internal pin states (0/1). Labels: e, t0, t1, ...
-        self.state = {}
+        # Tool occupancies live in an int bitmask indexed by tool number;
+        # the extruder switch is a single int. No dict hashing in callbacks.
         self.pin_by_label = {}
         self.t_indices = set()
+        self._label_kind = {}
 
         # Exposed status field
         self.current_tool = -2  # -2 unknown/error, -1 unmounted, >=0 tool index
-
-        # One-shot compute timer (re-armed on each edge)
-        self._compute_timer = None
+        # Status dict; rebuilt on change (webhooks diffing keeps a reference
+        # to the returned dict, so it must never be mutated in place)
+        self._status = {"current_tool": -2}
+
+        # Single persistent timer driven by a small state machine: it either
+        # waits for a debounced compute or polls a busy toolchanger.
+        self._timer = self.reactor.register_timer(
+            self._timer_cb, self.reactor.NEVER)
+        self._state = _IDLE
+        self._deadline = self.reactor.NEVER
         self._pending_reason = "startup"
-
-        # Toolchanger sync deferral timer
         self._pending_tc_ct = None
-        self._tc_timer = None
+        self._tc_backoff = 0.1
+
+        # Object registry is stable after startup; cache handles lazily
+        self._tc_obj = None
+        self._ps_obj = None
+
+        # Last ct actually dispatched to the toolchanger (dedupe)
+        self._last_sync_ct = None
+
+        # Verbose messages are buffered and emitted as one gcode response
+        # per compute/poll cycle instead of one respond_info per line
+        self._log_buf = []
 
         opts = list(config.get_prefix_options("pin_"))
         if not opts:
             raise config.error("pin_watch: no pins found. Add pin_<name>: <pin> options.")
 
+        ordered_labels = []
         for opt in opts:
             label = opt[len("pin_"):]  # pin_t0 -> t0
             pin_str = str(config.get(opt)).strip()
             self.pin_by_label[label] = pin_str
-
-            if label not in self.state:
-                self.state[label] = 0
+            ordered_labels.append(label)
 
             ti = self._parse_t_index(label)
             if ti is not None:
                 self.t_indices.add(ti)
-
-            self.buttons.register_debounce_button(pin_str, self._make_callback(label), config)
+                self._label_kind[label] = ("t", ti)
+            elif label == "e":
+                self._label_kind[label] = ("e", 0)
+
+        # Tool count is fixed at config time; precompute once for the hot path.
+        # Occupancy is a single int bitmask: bit i set == tool i docked.
+        self._N = (max(self.t_indices) + 1) if self.t_indices else 0
+        self._occ = 0
+        self._full = (1 << self._N) - 1
+        self._e = 0
+
+        # Batched registration: one reactor event delivers a whole pin
+        # bitmask, so grouped state updates land in one Python frame.
+        # register_buttons reports a one-byte mask and needs every pin of a
+        # group on the same MCU, so chunk per MCU with at most 8 pins each.
+        group_mcu = None
+        group_pins = []
+        group_slots = []
+        for label in ordered_labels:
+            pin_str = self.pin_by_label[label]
+            bare = pin_str.lstrip("^~!")
+            mcu = bare.split(":", 1)[0] if ":" in bare else "mcu"
+            if group_pins and (mcu != group_mcu or len(group_pins) >= 8):
+                self.buttons.register_buttons(
+                    group_pins, self._make_batch_cb(tuple(group_slots)))
+                group_pins = []
+                group_slots = []
+            group_mcu = mcu
+            group_pins.append(pin_str)
+            group_slots.append(self._label_kind.get(label, (None, 0)) + (label,))
+        if group_pins:
+            self.buttons.register_buttons(
+                group_pins, self._make_batch_cb(tuple(group_slots)))
+
+        # With sync and verbose both off, current_tool is the only external
+        # observable; edges that can't change it skip the timer entirely.
+        self._skip_noop = not (self.sync_toolchanger or self.verbose)
 
         if self.verbose:
             self._info(
@@ -80,70 +154,94 @@ class PinWatch:
 
     # --- status export for Jinja ---
     def get_status(self, eventtime):
-        return {"current_tool": int(self.current_tool)}
+        return self._status
 
     def _parse_t_index(self, label):
         if not label.startswith("t"):
             return None
-        try:
-            return int(label[1:])
-        except Exception:
-            return None
-
-    def _tool_count(self):
-        if not self.t_indices:
-            return 0
-        return max(self.t_indices) + 1
+        s = label[1:]
+        return int(s) if s.isdigit() else None
 
-    def _make_callback(self, label):
+    def _make_batch_cb(self, slots):
         def _cb(eventtime, state):
-            try:
-                s = int(state)
-                if self.state.get(label, None) == s:
-                    return
-                self.state[label] = s
+            self._batched_cb(eventtime, state, slots)
+        return _cb
+
+    def _batched_cb(self, eventtime, state, slots):
+        try:
+            reason = None
+            occ = self._occ
+            for bit, (kind, idx, label) in enumerate(slots):
+                s = (state >> bit) & 1
+                if kind == "t":
+                    if ((occ >> idx) & 1) == s:
+                        continue
+                    occ ^= 1 << idx
+                elif kind == "e":
+                    if self._e == s:
+                        continue
+                    self._e = s
+                else:
+                    # Pin doesn't feed the tool computation; nothing to track
+                    continue
+                reason = label
                 if self.verbose:
-                    self._info("pin_watch %s: %s -> %d (t=%.6f)" % (self.name, label, s, eventtime))
-                self._schedule_compute(label, self.assign_delay)
+                    self._log("pin_watch %s: %s -> %d (t=%.6f)" % (self.name, label, s, eventtime))
+            self._occ = occ
+            if reason is None:
+                return
+            if self._skip_noop and self._noop_edge():
+                return
+            self._schedule_compute(reason, self.assign_delay + self.debounce_delay)
+        except Exception:
+            logging.exception("pin_watch %s: exception in pin callback", self.name)
+            try:
+                self._flush_log()
+                self._info("pin_watch %s: ERROR in callback - see klippy.log" % self.name)
             except Exception:
-                logging.exception("pin_watch %s: exception in pin callback (%s)", self.name, label)
-                try:
-                    self._info("pin_watch %s: ERROR in callback (%s) - see klippy.log" % (self.name, label))
-                except Exception:
-                    pass
+                pass
 
-        return _cb
+    def _noop_edge(self):
+        # O(1) preview of the decision tree on the incremental counters;
+        # true when the edge cannot move current_tool
+        N = self._N
+        if N < 1:
+            return self.current_tool == -2
+        ex = self._e
+        occ = self._occ
+        S = bin(occ).count("1")
+        if ex == 0 and S == N:
+            ct = -1
+        elif ex == 1 and S == N - 1:
+            ct = (~occ & self._full).bit_length() - 1
+        else:
+            ct = -2
+        return ct == self.current_tool
 
     # --- compute algo (same as your macro) ---
     def _compute_current_tool(self):
-        N = self._tool_count()
+        N = self._N
         if N < 1:
             return -2, (N, None, None, None, 1)
 
-        ex = int(self.state.get("e", 0))
+        ex = self._e
         bad = 0
         if ex not in (0, 1):
             bad = 1
 
-        S = 0
-        empties = 0
-        empty_idx = -1
-
-        for i in range(N):
-            occ = int(self.state.get("t%d" % i, 0))
-            if occ not in (0, 1):
-                bad = 1
-            S += occ
-            if occ == 0:
-                empties += 1
-                empty_idx = i
+        # O(1) popcount over the occupancy mask; no scan loop at all
+        occ = self._occ
+        if occ >> N:
+            bad = 1
+        S = bin(occ).count("1")
+        empties = N - S
 
         if bad == 1:
             ct = -2
         elif ex == 0 and S == N:
             ct = -1
         elif ex == 1 and S == (N - 1) and empties == 1:
-            ct = empty_idx
+            ct = (~occ & self._full).bit_length() - 1
         else:
             ct = -2
 
@@ -152,68 +250,91 @@ class PinWatch:
     # --- scheduling compute (simple, reliable) ---
     def _schedule_compute(self, reason, delay):
         self._pending_reason = reason
-
-        # cancel previous timer and arm a new one (collapse bursts)
-        if self._compute_timer is not None:
-            try:
-                self.reactor.unregister_timer(self._compute_timer)
-            except Exception:
-                pass
-            self._compute_timer = None
-
+        # A fresh compute supersedes any deferred sync; it re-requests anyway
+        self._pending_tc_ct = None
         when = self.reactor.monotonic() + max(0.0, float(delay))
-        self._compute_timer = self.reactor.register_timer(self._compute_timer_cb, when)
-
-    def _compute_timer_cb(self, eventtime):
-        self._compute_timer = None
+        if self._state == _COMPUTE_PENDING and when <= self._deadline + 1e-4:
+            # Burst edge within the already-armed window; timer is fine as-is
+            return
+        self._state = _COMPUTE_PENDING
+        # Slide the persistent timer's deadline (collapse bursts)
+        self._deadline = when
+        self.reactor.update_timer(self._timer, when)
+
+    def _timer_cb(self, eventtime):
+        state = self._state
+        if state == _COMPUTE_PENDING:
+            self._run_compute(eventtime)
+        elif state == _TC_DEFERRED:
+            self._run_tc_poll(eventtime)
+        if self._log_buf:
+            self._flush_log()
+        # State may have moved while dispatching (sync deferred, or a
+        # re-entrant edge rescheduling compute); honor the new deadline.
+        if self._state == _IDLE:
+            return self.reactor.NEVER
+        return self._deadline
+
+    def _run_compute(self, eventtime):
+        self._state = _IDLE
         try:
             ct, dbg = self._compute_current_tool()
-            self.current_tool = int(ct)
+            self.current_tool = ct = int(ct)
+            if self._status["current_tool"] != ct:
+                self._status = {"current_tool": ct}
 
-            N, ex, S, empties, bad = dbg
-            self._info(
-                "pin_watch %s: APPLY current_tool=%d (reason=%s N=%s ex=%s S=%s empties=%s bad=%s)"
-                % (
-                    self.name,
-                    self.current_tool,
-                    str(self._pending_reason),
-                    str(N),
-                    str(ex),
-                    str(S),
-                    str(empties),
-                    str(bad),
+            if self.verbose:
+                N, ex, S, empties, bad = dbg
+                self._log(
+                    "pin_watch %s: APPLY current_tool=%d (reason=%s N=%s ex=%s S=%s empties=%s bad=%s)"
+                    % (
+                        self.name,
+                        self.current_tool,
+                        str(self._pending_reason),
+                        str(N),
+                        str(ex),
+                        str(S),
+                        str(empties),
+                        str(bad),
+                    )
                 )
-            )
             if self.sync_toolchanger:
                 self._request_toolchanger_sync(self.current_tool)
         except Exception:
             logging.exception("pin_watch %s: exception in compute/apply", self.name)
             try:
+                self._flush_log()
                 self._info("pin_watch %s: ERROR in compute/apply - see klippy.log" % self.name)
             except Exception:
                 pass
-        return self.reactor.NEVER
 
     # --- toolchanger sync ---
     def _get_toolchanger(self):
-        try:
-            return self.printer.lookup_object(self.toolchanger_name, None)
-        except Exception:
-            return None
+        if self._tc_obj is None:
+            try:
+                self._tc_obj = self.printer.lookup_object(self.toolchanger_name, None)
+            except Exception:
+                return None
+        return self._tc_obj
 
     def _toolchanger_busy(self):
         tc = self._get_toolchanger()
-        st = getattr(tc, "status", None) if tc else None
-        return st in _BUSY_STATUSES
+        if tc is None:
+            return False
+        try:
+            return tc.status in _BUSY_STATUSES
+        except AttributeError:
+            return False
 
     def _is_printing(self):
-        ps = self.printer.lookup_object("print_stats", None)
-        st = getattr(ps, "state", "") if ps else ""
-        return st == "printing"
+        ps = self._ps_obj
+        if ps is None:
+            ps = self._ps_obj = self.printer.lookup_object("print_stats", None)
+        return ps is not None and ps.state == "printing"
 
     def _run_cmd(self, line):
-        # your rule: ONLY this way
-        self.gcode.run_script_from_command(line)
+        # your rule: ONLY this way (bound once in __init__)
+        self._run_script(line)
 
     def _request_toolchanger_sync(self, ct):
         # Printing: only initialize for ct>=0, never unselect
@@ -222,7 +343,7 @@ class PinWatch:
                 self._sync_toolchanger_or_defer(ct)
             else:
                 if self.verbose:
-                    self._info("pin_watch %s: PRINTING -> skip UNSELECT (ct=%d)" % (self.name, int(ct)))
+                    self._log("pin_watch %s: PRINTING -> skip UNSELECT (ct=%d)" % (self.name, int(ct)))
             return
 
         # Not printing: full mirror
@@ -231,50 +352,73 @@ class PinWatch:
     def _sync_toolchanger_or_defer(self, ct):
         # If busy, defer with a timer (no gcode spam)
         if self._toolchanger_busy():
+            if self._pending_tc_ct is None:
+                self._tc_backoff = 0.1
+                self._deadline = self.reactor.monotonic() + self._tc_backoff
+                self.reactor.update_timer(self._timer, self._deadline)
+            self._state = _TC_DEFERRED
             self._pending_tc_ct = int(ct)
-            if self._tc_timer is None:
-                when = self.reactor.monotonic() + 0.1
-                self._tc_timer = self.reactor.register_timer(self._tc_timer_cb, when)
             if self.verbose:
                 tc = self._get_toolchanger()
                 st = getattr(tc, "status", None) if tc else None
-                self._info("pin_watch %s: toolchanger busy (status=%s) -> defer" % (self.name, str(st)))
+                self._log("pin_watch %s: toolchanger busy (status=%s) -> defer" % (self.name, str(st)))
             return
         self._do_toolchanger_sync(int(ct))
 
-    def _tc_timer_cb(self, eventtime):
-        self._tc_timer = None
+    def _run_tc_poll(self, eventtime):
         try:
             if self._pending_tc_ct is None:
-                return self.reactor.NEVER
+                self._state = _IDLE
+                return
 
-            # Still busy? re-arm timer (still no gcode spam)
+            # Still busy? back off and retry (still no gcode spam)
             if self._toolchanger_busy():
-                when = self.reactor.monotonic() + 0.1
-                self._tc_timer = self.reactor.register_timer(self._tc_timer_cb, when)
-                return self.reactor.NEVER
+                self._tc_backoff = min(self._tc_backoff * 2.0, 1.0)
+                self._deadline = eventtime + self._tc_backoff
+                return
 
             ct = int(self._pending_tc_ct)
             self._pending_tc_ct = None
+            self._tc_backoff = 0.1
+            self._state = _IDLE
             self._do_toolchanger_sync(ct)
         except Exception:
-            logging.exception("pin_watch %s: exception in tc timer", self.name)
+            logging.exception("pin_watch %s: exception in tc poll", self.name)
+            self._state = _IDLE
             try:
+                self._flush_log()
                 self._info("pin_watch %s: ERROR in toolchanger sync - see klippy.log" % self.name)
             except Exception:
                 pass
-        return self.reactor.NEVER
 
     def _do_toolchanger_sync(self, ct):
         # IMPORTANT: this runs only when toolchanger not busy (or when user forces it)
+        if ct == self._last_sync_ct:
+            if self.verbose:
+                self._log("pin_watch %s: sync unchanged (ct=%d) -> skip" % (self.name, ct))
+            return
         if ct >= 0:
             self._run_cmd("INITIALIZE_TOOLCHANGER T=%d" % ct)
             if self.verbose:
-                self._info("pin_watch %s: ASSIGN_TOOL -> INITIALIZE_TOOLCHANGER T=%d" % (self.name, ct))
+                self._log("pin_watch %s: ASSIGN_TOOL -> INITIALIZE_TOOLCHANGER T=%d" % (self.name, ct))
         else:
             self._run_cmd("UNSELECT_TOOL")
             if self.verbose:
-                self._info("pin_watch %s: ASSIGN_TOOL -> UNSELECT_TOOL (ct=%d)" % (self.name, ct))
+                self._log("pin_watch %s: ASSIGN_TOOL -> UNSELECT_TOOL (ct=%d)" % (self.name, ct))
+        # Record only after the command ran; if it raised, the next compute
+        # settling on the same ct must retry instead of being deduped away
+        self._last_sync_ct = ct
+
+    def _log(self, msg):
+        # Buffered verbose line; flushed once per compute/poll cycle
+        self._log_buf.append(msg)
+
+    def _flush_log(self):
+        if not self._log_buf:
+            return
+        buf = self._log_buf
+        self._log_buf = []
+        self._info("\n".join(buf))
 
     def _info(self, msg):
         if not self.verbose: